@@ -1,3 +1,4 @@
+import time
 from collections.abc import Generator
 from typing import Annotated
 
@@ -8,11 +9,13 @@ from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
 from sqlmodel import Session
 
+from app import crud
 from app.core import security
 from app.core.config import settings
 from app.core.db import engine
 from app.models import TokenPayload, User
 from app.util.redis_client import try_acquire_slots, RedisSlot
+from app.util.ttl_cache import TTLCache
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
@@ -27,19 +30,39 @@ def get_db() -> Generator[Session, None, None]:
 SessionDep = Annotated[Session, Depends(get_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
+# Decoded token payloads, keyed by a digest of the raw token. Entries never
+# outlive the token's own `exp` claim, and failed decodes are never cached.
+_JWT_CACHE_TTL = 60
+_jwt_cache = TTLCache(maxsize=10000, ttl=_JWT_CACHE_TTL)
+
+
+def _decode_token(token: str) -> TokenPayload:
+    key = security.token_cache_key(token)
+    cached: TokenPayload | None = _jwt_cache.get(key)
+    if cached is not None:
+        return cached
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[security.ALGORITHM])
+    token_data = TokenPayload(**payload)
+    exp = payload.get("exp")
+    ttl = _JWT_CACHE_TTL if exp is None else min(_JWT_CACHE_TTL, exp - time.time())
+    _jwt_cache.set(key, token_data, ttl=ttl)
+    return token_data
+
 
 def get_current_user(session: SessionDep, token: TokenDep) -> User:
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
-        )
-        token_data = TokenPayload(**payload)
+        token_data = _decode_token(token)
     except (InvalidTokenError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = session.get(User, token_data.sub)
+    if token_data.sub is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Could not validate credentials",
+        )
+    user = crud.get_cached_user(session=session, user_id=token_data.sub)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
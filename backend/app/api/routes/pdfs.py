@@ -1,7 +1,12 @@
+import os
 import uuid
 import re
+import string
+import asyncio
 import logging
-from typing import List, Optional
+import tempfile
+import contextlib
+from typing import BinaryIO, List, Optional, Tuple
 from fastapi import (
     APIRouter,
     Depends,
@@ -11,15 +16,17 @@ from fastapi import (
     BackgroundTasks,
     Form,
 )
-from sqlmodel import Session, select
+from sqlmodel import Session, func, select
 from app.api.deps import CurrentUser, SessionDep, check_upload_concurrency
 from app.core.config import settings
+from app.core.db import engine
 from app.models import (
     PDFDocument,
     PDFDocumentCreate,
     PDFDocumentUpdate,
     PDFDocumentPublic,
     PDFDocumentsPublic,
+    User,
 )
 from app.services.pdf_service import pdf_service
 from app.utils import validate_pdf_integrity
@@ -28,32 +35,82 @@ from app.util.redis_client import RedisSlot
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Size of the chunks used to stream uploads to disk
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+_SPECIAL_CHARS = re.compile(r'[^\w\s\-]')  # Allow word chars, spaces, and hyphens
+_MULTISPACE = re.compile(r'\s+')
+_NON_TITLE_CHARS = re.compile(r'[^\w\s$%#&]')  # Keep word chars, spaces and $%#&
+# ASCII characters _SPECIAL_CHARS accepts, for a regex-free check
+_PLAIN_TITLE_CHARS = frozenset(string.ascii_letters + string.digits + string.whitespace + "_-")
+
+
+def _strip_extension(filename: str) -> str:
+    return filename.rsplit('.', 1)[0] if '.' in filename else filename
+
+
+def has_special_chars(filename: str) -> bool:
+    """
+    Check whether a filename (without extension) contains special characters,
+    i.e. whether its title is worth polishing with ChatGPT.
+    """
+    return bool(_SPECIAL_CHARS.search(_strip_extension(filename)))
+
+
+def _truncate_title(title: str, max_length: int) -> str:
+    """Shorten a title to max_length characters without a trailing space"""
+    if len(title) > max_length:
+        title = title[:max_length].rstrip()
+    return title
+
 
 def generate_default_title(filename: str, max_length: int = 50) -> str:
     """
     Generate a default title from filename with the following steps:
     1. Check for special characters
-    2. If special characters exist, use ChatGPT to clean them (keep meaningful ones)
+    2. If special characters exist, clean them with basic rules
+       (ChatGPT polishing runs later in the background, see polish_pdf_title)
     3. If title is still too long, shorten to max_length characters
     """
     # Remove file extension first
-    title = filename.rsplit('.', 1)[0] if '.' in filename else filename
+    title = _strip_extension(filename)
     
-    # Step 1: Check if there are special characters
-    special_chars_pattern = r'[^\w\s\-]'  # Allow word chars, spaces, and hyphens
-    has_special_chars = bool(re.search(special_chars_pattern, title))
+    # Fast path: short filenames made of plain ASCII characters need no work
+    if len(title) <= max_length and _PLAIN_TITLE_CHARS.issuperset(title):
+        return title if title.strip() else "Untitled Document"
     
-    # Step 2: If special characters exist, use ChatGPT to clean them
-    if has_special_chars:
-        title = _clean_title_with_chatgpt(title)
+    # Step 1 & 2: If special characters exist, clean them
+    if _SPECIAL_CHARS.search(title):
+        title = _basic_title_cleanup(title)
     
     # Step 3: If title is still too long, shorten it
-    if len(title) > max_length:
-        title = title[:max_length]
+    title = _truncate_title(title, max_length)
     
     return title if title.strip() else "Untitled Document"
 
 
+def polish_pdf_title(
+    pdf_id: uuid.UUID, filename: str, default_title: str, max_length: int = 50
+) -> None:
+    """
+    Background task: replace a PDF's default title with a ChatGPT-cleaned one
+    (keeping meaningful special characters), unless the title was changed in
+    the meantime.
+    """
+    title = _clean_title_with_chatgpt(_strip_extension(filename))
+    title = _truncate_title(title, max_length)
+    if not title.strip() or title == default_title:
+        return
+
+    with Session(engine) as db:
+        pdf_document = db.get(PDFDocument, pdf_id)
+        if not pdf_document or pdf_document.title != default_title:
+            return
+        pdf_document.title = title
+        db.add(pdf_document)
+        db.commit()
+
+
 def _clean_title_with_chatgpt(title: str) -> str:
     """
     Use ChatGPT to clean special characters from title, keeping meaningful ones.
@@ -103,11 +160,15 @@ def _basic_title_cleanup(title: str) -> str:
     # Replace underscores and hyphens with spaces
     # title = title.replace('_', ' ').replace('-', ' ')
     
+    # Fast path: plain ASCII letters and digits have nothing to clean up
+    if title.isascii() and title.isalnum():
+        return title.title()
+    
     # Remove most special characters but keep some meaningful ones
-    title = re.sub(r'[^\w\s$%#&]', '', title)
+    title = _NON_TITLE_CHARS.sub('', title)
     
     # Clean up multiple spaces
-    title = re.sub(r'\s+', ' ', title).strip()
+    title = _MULTISPACE.sub(' ', title).strip()
     
     # Capitalize first letter of each word
     title = title.title()
@@ -115,8 +176,53 @@ def _basic_title_cleanup(title: str) -> str:
     return title
 
 
+def _spool_upload(source: BinaryIO, max_size: int) -> Tuple[str, int]:
+    """
+    Copy an upload in chunks into a temporary file next to the PDF storage,
+    so memory use stays constant and saving the file later is a rename.
+    
+    Returns:
+        The temporary file path and the file size in bytes
+    """
+    with tempfile.NamedTemporaryFile(
+        delete=False, suffix=".pdf", dir=pdf_service.pdf_storage_path
+    ) as tmp_file:
+        try:
+            file_size = 0
+            while chunk := source.read(UPLOAD_CHUNK_SIZE):
+                file_size += len(chunk)
+                # Check if file size exceeds limit
+                if file_size > max_size:
+                    raise HTTPException(
+                        status_code=400,
+                        detail="File size exceeds the maximum allowed size of 10 MB.",
+                    )
+                tmp_file.write(chunk)
+        except BaseException:
+            os.remove(tmp_file.name)
+            raise
+    return tmp_file.name, file_size
+
+
+def _remove_if_exists(path: str) -> None:
+    # Removing and ignoring a missing file avoids an exists-then-remove race
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+
+
+def _save_and_refresh(db: Session, pdf_document: PDFDocument) -> None:
+    db.add(pdf_document)
+    db.commit()
+    db.refresh(pdf_document)
+
+
+def _delete_and_commit(db: Session, pdf_document: PDFDocument) -> None:
+    db.delete(pdf_document)
+    db.commit()
+
+
 @router.post("/", response_model=PDFDocumentPublic)
-def create_pdf_document(
+async def create_pdf_document(
     *,
     db: SessionDep,
     current_user: CurrentUser,
@@ -143,32 +249,33 @@ def create_pdf_document(
     # Check file size limit (10MB)
     MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB in bytes
 
-    # Read file content
+    # Blocking file I/O, PDF parsing and DB calls run in worker threads so
+    # concurrent uploads don't stall the event loop
     try:
-        file_content = file.file.read()
-        file_size = len(file_content)
-
-        # Check if file size exceeds limit
-        if file_size > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File size ({file_size / (1024*1024):.2f} MB) exceeds the maximum allowed size of 10 MB.",
-            )
+        tmp_path, file_size = await asyncio.to_thread(
+            _spool_upload, file.file, MAX_FILE_SIZE
+        )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error reading file: {str(e)}")
 
-    # Validate PDF file integrity - check if file can be opened and read
-    error_message = validate_pdf_integrity(file_content)
-    if error_message:
-        raise HTTPException(status_code=400, detail=error_message)
-
-    # Save file to storage
     try:
-        file_path = pdf_service.save_pdf_file(file_content, file.filename)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error saving file: {str(e)}")
+        # Validate PDF file integrity - check if file can be opened and read
+        error_message = await asyncio.to_thread(validate_pdf_integrity, tmp_path)
+        if error_message:
+            raise HTTPException(status_code=400, detail=error_message)
+
+        # Move file to storage
+        try:
+            file_path = await asyncio.to_thread(
+                pdf_service.save_pdf_file, tmp_path, file.filename
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error saving file: {str(e)}")
+    finally:
+        # Already gone once the file has been moved into storage
+        await asyncio.to_thread(_remove_if_exists, tmp_path)
 
     # Generate title from filename (ignore frontend title parameter)
     title = generate_default_title(file.filename)
@@ -185,13 +292,36 @@ def create_pdf_document(
         owner_id=current_user.id,
     )
 
-    db.add(pdf_document)
-    db.commit()
-    db.refresh(pdf_document)
+    await asyncio.to_thread(_save_and_refresh, db, pdf_document)
+
+    # Polish the title with ChatGPT without holding up the upload
+    if has_special_chars(file.filename):
+        background_tasks.add_task(
+            polish_pdf_title, pdf_document.id, file.filename, title
+        )
 
     # Process PDF in background
     
-    return PDFDocumentPublic.from_orm(pdf_document)
+    return PDFDocumentPublic.model_validate(pdf_document)
+
+
+def _get_pdf_document(
+    db: Session, current_user: User, pdf_id: uuid.UUID
+) -> PDFDocument:
+    """
+    Fetch a PDF document the current user may access, or raise 404.
+    
+    Ownership is checked in the query itself, so documents owned by someone
+    else are indistinguishable from missing ones.
+    """
+    statement = select(PDFDocument).where(PDFDocument.id == pdf_id)
+    if not current_user.is_superuser:
+        statement = statement.where(PDFDocument.owner_id == current_user.id)
+    pdf_document = db.exec(statement).first()
+
+    if not pdf_document:
+        raise HTTPException(status_code=404, detail="PDF document not found")
+    return pdf_document
 
 
 @router.get("/", response_model=PDFDocumentsPublic)
@@ -207,7 +337,7 @@ def read_pdf_documents(
     # Only admins can see all PDFs, regular users see only their own
     if current_user.is_superuser:
         statement = select(PDFDocument).offset(skip).limit(limit)
-        count_statement = select(PDFDocument)
+        count_statement = select(func.count()).select_from(PDFDocument)
     else:
         statement = (
             select(PDFDocument)
@@ -215,12 +345,14 @@ def read_pdf_documents(
             .offset(skip)
             .limit(limit)
         )
-        count_statement = select(PDFDocument).where(
-            PDFDocument.owner_id == current_user.id
+        count_statement = (
+            select(func.count())
+            .select_from(PDFDocument)
+            .where(PDFDocument.owner_id == current_user.id)
         )
 
     pdf_documents = db.exec(statement).all()
-    total_count = len(db.exec(count_statement).all())
+    total_count = db.exec(count_statement).one()
 
     return PDFDocumentsPublic(data=pdf_documents, count=total_count)
 
@@ -235,17 +367,9 @@ def read_pdf_document(
     """
     Get PDF document by ID.
     """
-    statement = select(PDFDocument).where(PDFDocument.id == pdf_id)
-    pdf_document = db.exec(statement).first()
+    pdf_document = _get_pdf_document(db, current_user, pdf_id)
 
-    if not pdf_document:
-        raise HTTPException(status_code=404, detail="PDF document not found")
-
-    # Check permissions
-    if not current_user.is_superuser and pdf_document.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-
-    return PDFDocumentPublic.from_orm(pdf_document)
+    return PDFDocumentPublic.model_validate(pdf_document)
 
 
 @router.put("/{pdf_id}", response_model=PDFDocumentPublic)
@@ -259,18 +383,10 @@ def update_pdf_document(
     """
     Update PDF document.
     """
-    statement = select(PDFDocument).where(PDFDocument.id == pdf_id)
-    pdf_document = db.exec(statement).first()
-
-    if not pdf_document:
-        raise HTTPException(status_code=404, detail="PDF document not found")
-
-    # Check permissions
-    if not current_user.is_superuser and pdf_document.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
+    pdf_document = _get_pdf_document(db, current_user, pdf_id)
 
     # Update fields
-    update_data = pdf_document_in.dict(exclude_unset=True)
+    update_data = pdf_document_in.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(pdf_document, field, value)
 
@@ -278,7 +394,7 @@ def update_pdf_document(
     db.commit()
     db.refresh(pdf_document)
 
-    return PDFDocumentPublic.from_orm(pdf_document)
+    return PDFDocumentPublic.model_validate(pdf_document)
 
 
 @router.get("/{pdf_id}/download")
@@ -291,15 +407,7 @@ def download_pdf_document(
     """
     Download PDF document.
     """
-    statement = select(PDFDocument).where(PDFDocument.id == pdf_id)
-    pdf_document = db.exec(statement).first()
-
-    if not pdf_document:
-        raise HTTPException(status_code=404, detail="PDF document not found")
-
-    # Check permissions
-    if not current_user.is_superuser and pdf_document.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
+    pdf_document = _get_pdf_document(db, current_user, pdf_id)
 
     # Check if file exists
     import os
@@ -318,7 +426,7 @@ def download_pdf_document(
 
 
 @router.delete("/{pdf_id}")
-def delete_pdf_document(
+async def delete_pdf_document(
     *,
     db: SessionDep,
     current_user: CurrentUser,
@@ -327,49 +435,35 @@ def delete_pdf_document(
     """
     Delete PDF document.
     """
-    statement = select(PDFDocument).where(PDFDocument.id == pdf_id)
-    pdf_document = db.exec(statement).first()
-
-    if not pdf_document:
-        raise HTTPException(status_code=404, detail="PDF document not found")
-
-    # Check permissions
-    if not current_user.is_superuser and pdf_document.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
+    # Blocking DB, ChromaDB and filesystem calls run in worker threads
+    pdf_document = await asyncio.to_thread(_get_pdf_document, db, current_user, pdf_id)
 
     try:
-        import logging
-
-        logger = logging.getLogger(__name__)
         logger.info(f"Starting deletion process for PDF {pdf_id}")
 
         # Delete embeddings from ChromaDB (don't fail if this doesn't work)
         try:
             logger.info(f"Attempting to delete ChromaDB embeddings for PDF {pdf_id}")
-            result = pdf_service.delete_pdf_embeddings(pdf_id)
+            result = await asyncio.to_thread(pdf_service.delete_pdf_embeddings, pdf_id)
             logger.info(f"ChromaDB deletion result: {result}")
         except Exception as e:
             # Log but don't fail the deletion
             logger.warning(f"Failed to delete embeddings for PDF {pdf_id}: {e}")
 
         # Delete file from storage
-        import os
-
-        if os.path.exists(pdf_document.filename):
-            try:
-                logger.info(f"Deleting file: {pdf_document.filename}")
-                os.remove(pdf_document.filename)
-                logger.info(f"Successfully deleted file: {pdf_document.filename}")
-            except Exception as e:
-                # Log but don't fail the deletion
-                logger.warning(f"Failed to delete file {pdf_document.filename}: {e}")
-        else:
+        try:
+            logger.info(f"Deleting file: {pdf_document.filename}")
+            await asyncio.to_thread(os.remove, pdf_document.filename)
+            logger.info(f"Successfully deleted file: {pdf_document.filename}")
+        except FileNotFoundError:
             logger.warning(f"File not found: {pdf_document.filename}")
+        except Exception as e:
+            # Log but don't fail the deletion
+            logger.warning(f"Failed to delete file {pdf_document.filename}: {e}")
 
         # Delete from database
         logger.info(f"Deleting PDF record from database: {pdf_id}")
-        db.delete(pdf_document)
-        db.commit()
+        await asyncio.to_thread(_delete_and_commit, db, pdf_document)
         logger.info(f"Successfully deleted PDF {pdf_id} from database")
 
         return {"message": "PDF document deleted successfully"}
@@ -377,7 +471,7 @@ def delete_pdf_document(
     except Exception as e:
         # Rollback database changes if there was an error
         logger.error(f"Error during PDF deletion: {e}")
-        db.rollback()
+        await asyncio.to_thread(db.rollback)
         raise HTTPException(
             status_code=500, detail=f"Error deleting PDF document: {str(e)}"
         )
@@ -393,15 +487,7 @@ def get_pdf_processing_status(
     """
     Get PDF processing status.
     """
-    statement = select(PDFDocument).where(PDFDocument.id == pdf_id)
-    pdf_document = db.exec(statement).first()
-
-    if not pdf_document:
-        raise HTTPException(status_code=404, detail="PDF document not found")
-
-    # Check permissions
-    if not current_user.is_superuser and pdf_document.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
+    pdf_document = _get_pdf_document(db, current_user, pdf_id)
 
     return {
         "id": str(pdf_document.id),
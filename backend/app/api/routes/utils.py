@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from pydantic.networks import EmailStr
 
 from app.api.deps import get_current_active_superuser
+from app.core.config import settings
 from app.models import Message
 from app.utils import generate_test_email, send_email
 
@@ -13,12 +14,16 @@ router = APIRouter(prefix="/utils", tags=["utils"])
     dependencies=[Depends(get_current_active_superuser)],
     status_code=201,
 )
-def test_email(email_to: EmailStr) -> Message:
+def test_email(email_to: EmailStr, background_tasks: BackgroundTasks) -> Message:
     """
     Test emails.
     """
+    # Sending happens after the response, so report missing config up front
+    if not settings.emails_enabled:
+        raise HTTPException(status_code=503, detail="Sending emails is not configured")
     email_data = generate_test_email(email_to=email_to)
-    send_email(
+    background_tasks.add_task(
+        send_email,
         email_to=email_to,
         subject=email_data.subject,
         html_content=email_data.html_content,
@@ -87,6 +87,10 @@ class Settings(BaseSettings):
         return self
 
     EMAIL_RESET_TOKEN_EXPIRE_HOURS: int = 48
+    # Compiled email templates are persisted here across process restarts.
+    # Must be a directory private to the app's user; unset uses Jinja's
+    # per-user default in the temp dir.
+    JINJA_BYTECODE_CACHE_DIR: str | None = None
 
     @computed_field  # type: ignore[prop-decorator]
     @property
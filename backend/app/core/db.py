@@ -21,6 +21,10 @@ def init_db(session: Session) -> None:
 
     # This works because the models are already imported and registered from app.models
     SQLModel.metadata.create_all(engine)
+    # create_all() skips tables that already exist, so an index added to a
+    # model later (e.g. ix_pdfdocument_owner_id) must be created explicitly
+    for index in SQLModel.metadata.tables["pdfdocument"].indexes:
+        index.create(engine, checkfirst=True)
 
     user = session.exec(
         select(User).where(User.email == settings.FIRST_SUPERUSER)
@@ -1,10 +1,16 @@
 import uuid
 from typing import Any
 
+from sqlalchemy.orm import make_transient_to_detached
 from sqlmodel import Session, select
 
 from app.core.security import get_password_hash, verify_password
 from app.models import Item, ItemCreate, User, UserCreate, UserUpdate
+from app.util.ttl_cache import TTLCache
+
+# Column snapshots of recently loaded users, keyed by str(user.id). Anything
+# that modifies or deletes a user row must call invalidate_cached_user.
+_user_cache = TTLCache(maxsize=5000, ttl=30)
 
 
 def create_user(*, session: Session, user_create: UserCreate) -> User:
@@ -27,10 +33,28 @@ def update_user(*, session: Session, db_user: User, user_in: UserUpdate) -> Any:
     db_user.sqlmodel_update(user_data, update=extra_data)
     session.add(db_user)
     session.commit()
+    invalidate_cached_user(db_user.id)
     session.refresh(db_user)
     return db_user
 
 
+def get_cached_user(*, session: Session, user_id: uuid.UUID | str) -> User | None:
+    snapshot = _user_cache.get(str(user_id))
+    if snapshot is None:
+        db_user = session.get(User, user_id)
+        if db_user:
+            _user_cache.set(str(user_id), db_user.model_dump())
+        return db_user
+    # Rebuild the row as if it had just been loaded, without a round-trip
+    cached_user = User(**snapshot)
+    make_transient_to_detached(cached_user)
+    return session.merge(cached_user, load=False)
+
+
+def invalidate_cached_user(user_id: uuid.UUID | str) -> None:
+    _user_cache.pop(str(user_id))
+
+
 def get_user_by_email(*, session: Session, email: str) -> User | None:
     statement = select(User).where(User.email == email)
     session_user = session.exec(statement).first()
@@ -148,7 +148,7 @@ class PDFDocumentUpdate(SQLModel):
 class PDFDocument(PDFDocumentBase, table=True):
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     owner_id: uuid.UUID = Field(
-        foreign_key="user.id", nullable=False, ondelete="CASCADE"
+        foreign_key="user.id", nullable=False, ondelete="CASCADE", index=True
     )
     owner: User | None = Relationship(back_populates="pdf_documents")
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -1,4 +1,5 @@
 import os
+import shutil
 import uuid
 import logging
 from pathlib import Path
@@ -81,8 +82,8 @@ class PDFService:
                 logger.error(f"Failed to create new ChromaDB: {e2}")
                 return None
 
-    def save_pdf_file(self, file_content: bytes, filename: str) -> str:
-        """Save PDF file to storage and return the file path"""
+    def save_pdf_file(self, source_path: str, filename: str) -> str:
+        """Move an uploaded PDF file into storage and return the file path"""
         # Create date-based directory structure
         today = datetime.now()
         date_path = self.pdf_storage_path / str(today.year) / str(today.month).zfill(2)
@@ -94,9 +95,8 @@ class PDFService:
         unique_filename = f"{file_uuid}{file_extension}"
         file_path = date_path / unique_filename
 
-        # Save file
-        with open(file_path, "wb") as f:
-            f.write(file_content)
+        # Move file; a rename when source_path is on the storage filesystem
+        shutil.move(source_path, file_path)
 
         return str(file_path)
 
@@ -1,5 +1,8 @@
+import base64
+import json
 from unittest.mock import patch
 
+import jwt
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 
@@ -9,7 +12,7 @@ from app.crud import create_user
 from app.models import UserCreate
 from app.tests.utils.user import user_authentication_headers
 from app.tests.utils.utils import random_email, random_lower_string
-from app.utils import generate_password_reset_token
+from app.utils import generate_password_reset_token, verify_password_reset_token
 
 
 def test_get_access_token(client: TestClient) -> None:
@@ -61,6 +64,22 @@ def test_recovery_password(
         assert r.json() == {"message": "Password recovery email sent"}
 
 
+def test_recovery_password_emails_disabled(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    with (
+        patch("app.core.config.settings.SMTP_HOST", None),
+        patch("app.api.routes.login.send_email") as send_email,
+    ):
+        r = client.post(
+            f"{settings.API_V1_STR}/password-recovery/{settings.EMAIL_TEST_USER}",
+            headers=normal_user_token_headers,
+        )
+    assert r.status_code == 503
+    assert r.json() == {"detail": "Sending emails is not configured"}
+    send_email.assert_not_called()
+
+
 def test_recovery_password_user_not_exits(
     client: TestClient, normal_user_token_headers: dict[str, str]
 ) -> None:
@@ -116,3 +135,36 @@ def test_reset_password_invalid_token(
     assert "detail" in response
     assert r.status_code == 400
     assert response["detail"] == "Invalid token"
+
+
+def test_password_reset_token_matches_pyjwt() -> None:
+    email = random_email()
+    now = 1_700_000_000
+    with patch("app.utils.time.time", return_value=now + 0.75):
+        token = generate_password_reset_token(email=email)
+    expected = jwt.encode(
+        {
+            "exp": now + settings.EMAIL_RESET_TOKEN_EXPIRE_HOURS * 3600,
+            "nbf": now,
+            "sub": email,
+        },
+        settings.SECRET_KEY,
+        algorithm="HS256",
+    )
+    assert token == expected
+
+
+def test_verify_password_reset_token_rejects_tampered_payload() -> None:
+    email = random_email()
+    token = generate_password_reset_token(email=email)
+    assert verify_password_reset_token(token) == email
+
+    header, payload, signature = token.split(".")
+    claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    claims["sub"] = random_email()
+    forged_payload = (
+        base64.urlsafe_b64encode(json.dumps(claims, separators=(",", ":")).encode())
+        .rstrip(b"=")
+        .decode()
+    )
+    assert verify_password_reset_token(f"{header}.{forged_payload}.{signature}") is None
@@ -0,0 +1,200 @@
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.api.routes.pdfs import (
+    generate_default_title,
+    has_special_chars,
+    polish_pdf_title,
+)
+from app.core.config import settings
+from app.services.pdf_service import pdf_service
+from app.tests.utils.pdf import create_random_pdf_document, minimal_pdf
+
+
+@pytest.fixture
+def pdf_storage(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> Path:
+    monkeypatch.setattr(pdf_service, "pdf_storage_path", tmp_path)
+    return tmp_path
+
+
+def test_upload_pdf(
+    client: TestClient, superuser_token_headers: dict[str, str], pdf_storage: Path
+) -> None:
+    content = minimal_pdf()
+    r = client.post(
+        f"{settings.API_V1_STR}/pdfs/",
+        headers=superuser_token_headers,
+        files={"file": ("report.pdf", content, "application/pdf")},
+    )
+    assert r.status_code == 200
+    pdf_document = r.json()
+    assert pdf_document["title"] == "report"
+    assert pdf_document["file_size"] == len(content)
+    stored = Path(pdf_document["filename"])
+    assert stored.is_relative_to(pdf_storage)
+    assert stored.read_bytes() == content
+    assert not list(pdf_storage.glob("tmp*.pdf"))
+
+
+def test_upload_pdf_too_large(
+    client: TestClient, superuser_token_headers: dict[str, str], pdf_storage: Path
+) -> None:
+    content = minimal_pdf() + b"\0" * (10 * 1024 * 1024)
+    r = client.post(
+        f"{settings.API_V1_STR}/pdfs/",
+        headers=superuser_token_headers,
+        files={"file": ("large.pdf", content, "application/pdf")},
+    )
+    assert r.status_code == 400
+    assert r.json() == {
+        "detail": "File size exceeds the maximum allowed size of 10 MB."
+    }
+    assert not list(pdf_storage.rglob("*.pdf"))
+
+
+def test_upload_pdf_invalid(
+    client: TestClient, superuser_token_headers: dict[str, str], pdf_storage: Path
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/pdfs/",
+        headers=superuser_token_headers,
+        files={"file": ("broken.pdf", b"%PDF-1.4\ntruncated", "application/pdf")},
+    )
+    assert r.status_code == 400
+    assert "missing %%EOF marker" in r.json()["detail"]
+    assert not list(pdf_storage.rglob("*.pdf"))
+
+
+def test_upload_pdf_not_superuser(
+    client: TestClient, normal_user_token_headers: dict[str, str], pdf_storage: Path
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/pdfs/",
+        headers=normal_user_token_headers,
+        files={"file": ("report.pdf", minimal_pdf(), "application/pdf")},
+    )
+    assert r.status_code == 403
+    assert not list(pdf_storage.rglob("*.pdf"))
+
+
+def test_upload_pdf_save_failure_removes_temp_file(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    pdf_storage: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    spooled: list[str] = []
+
+    def failing_save(source_path: str, filename: str) -> str:  # noqa: ARG001
+        spooled.append(source_path)
+        raise OSError("disk full")
+
+    monkeypatch.setattr(pdf_service, "save_pdf_file", failing_save)
+    r = client.post(
+        f"{settings.API_V1_STR}/pdfs/",
+        headers=superuser_token_headers,
+        files={"file": ("report.pdf", minimal_pdf(), "application/pdf")},
+    )
+    assert r.status_code == 500
+    assert r.json() == {"detail": "Error saving file: disk full"}
+    # The spooled upload existed and was cleaned up by the handler
+    assert len(spooled) == 1
+    assert Path(spooled[0]).parent == pdf_storage
+    assert not Path(spooled[0]).exists()
+
+
+@pytest.mark.parametrize(
+    "filename, expected",
+    [
+        ("Annual Report 2024.pdf", False),
+        ("annual_report-v2.pdf", False),
+        ("report.final.pdf", True),
+        ("$1 for everything!.pdf", True),
+        ("30% discount.pdf", True),
+    ],
+)
+def test_has_special_chars(filename: str, expected: bool) -> None:
+    assert has_special_chars(filename) is expected
+
+
+def test_polish_pdf_title_updates_default_title(db: Session) -> None:
+    pdf_document = create_random_pdf_document(db, title="1 For Everything")
+    with patch(
+        "app.api.routes.pdfs._clean_title_with_chatgpt",
+        return_value="$1 for everything!",
+    ):
+        polish_pdf_title(pdf_document.id, "$1 for everything!.pdf", "1 For Everything")
+    db.refresh(pdf_document)
+    assert pdf_document.title == "$1 for everything!"
+
+
+def test_polish_pdf_title_keeps_edited_title(db: Session) -> None:
+    # The user renamed the document before the background task ran
+    pdf_document = create_random_pdf_document(db, title="My Own Title")
+    with patch(
+        "app.api.routes.pdfs._clean_title_with_chatgpt",
+        return_value="$1 for everything!",
+    ):
+        polish_pdf_title(pdf_document.id, "$1 for everything!.pdf", "1 For Everything")
+    db.refresh(pdf_document)
+    assert pdf_document.title == "My Own Title"
+
+
+def test_polish_pdf_title_truncates_long_title(db: Session) -> None:
+    pdf_document = create_random_pdf_document(db, title="Default")
+    cleaned = "a" * 49 + " " + "b" * 20
+    with patch("app.api.routes.pdfs._clean_title_with_chatgpt", return_value=cleaned):
+        polish_pdf_title(pdf_document.id, "long name!.pdf", "Default")
+    db.refresh(pdf_document)
+    assert pdf_document.title == "a" * 49
+
+
+def test_read_pdf_document_of_other_user_is_not_found(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    pdf_document = create_random_pdf_document(db)
+    r = client.get(
+        f"{settings.API_V1_STR}/pdfs/{pdf_document.id}",
+        headers=normal_user_token_headers,
+    )
+    # Indistinguishable from a document that doesn't exist
+    assert r.status_code == 404
+    assert r.json() == {"detail": "PDF document not found"}
+
+
+def test_read_pdf_document_superuser(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    pdf_document = create_random_pdf_document(db)
+    r = client.get(
+        f"{settings.API_V1_STR}/pdfs/{pdf_document.id}",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    assert r.json()["id"] == str(pdf_document.id)
+
+
+@pytest.mark.parametrize(
+    "filename, expected",
+    [
+        # Plain names are kept as they are
+        ("Annual Report 2024.pdf", "Annual Report 2024"),
+        ("report_v2-final.pdf", "report_v2-final"),
+        # Special characters are cleaned up
+        ("$1 for everything!.pdf", "$1 For Everything"),
+        ("résumé (final).pdf", "Résumé Final"),
+        # Truncated to 50 characters without a trailing space
+        ("a" * 49 + " " + "b" * 10 + ".pdf", "a" * 49),
+        ("x" * 60 + ".pdf", "x" * 50),
+        # Nothing usable left
+        ("!!!.pdf", "Untitled Document"),
+        ("   .pdf", "Untitled Document"),
+        (".pdf", "Untitled Document"),
+    ],
+)
+def test_generate_default_title(filename: str, expected: str) -> None:
+    assert generate_default_title(filename) == expected
@@ -0,0 +1,41 @@
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+
+def test_test_email(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    with (
+        patch("app.core.config.settings.SMTP_HOST", "smtp.example.com"),
+        patch("app.core.config.settings.EMAILS_FROM_EMAIL", "admin@example.com"),
+        patch("app.api.routes.utils.send_email") as send_email,
+    ):
+        r = client.post(
+            f"{settings.API_V1_STR}/utils/test-email/",
+            headers=superuser_token_headers,
+            params={"email_to": "test@example.com"},
+        )
+    assert r.status_code == 201
+    assert r.json() == {"message": "Test email sent"}
+    send_email.assert_called_once()
+    assert send_email.call_args.kwargs["email_to"] == "test@example.com"
+
+
+def test_test_email_emails_disabled(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    with (
+        patch("app.core.config.settings.SMTP_HOST", None),
+        patch("app.api.routes.utils.send_email") as send_email,
+    ):
+        r = client.post(
+            f"{settings.API_V1_STR}/utils/test-email/",
+            headers=superuser_token_headers,
+            params={"email_to": "test@example.com"},
+        )
+    assert r.status_code == 503
+    assert r.json() == {"detail": "Sending emails is not configured"}
+    send_email.assert_not_called()
@@ -0,0 +1,24 @@
+from sqlalchemy import inspect, text
+from sqlmodel import Session
+
+from app.core.db import engine, init_db
+
+
+def pdfdocument_index_names() -> set[str | None]:
+    return {index["name"] for index in inspect(engine).get_indexes("pdfdocument")}
+
+
+def test_init_db_adds_missing_owner_index(db: Session) -> None:
+    # End the shared session's transaction so the DDL isn't blocked by its locks
+    db.commit()
+    # A table created before owner_id was indexed
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX IF EXISTS ix_pdfdocument_owner_id"))
+    assert "ix_pdfdocument_owner_id" not in pdfdocument_index_names()
+
+    init_db(db)
+    assert "ix_pdfdocument_owner_id" in pdfdocument_index_names()
+
+    # Running again on an up-to-date schema is a no-op
+    init_db(db)
+    assert "ix_pdfdocument_owner_id" in pdfdocument_index_names()
@@ -1,7 +1,10 @@
+import uuid
+
 from fastapi.encoders import jsonable_encoder
 from sqlmodel import Session
 
 from app import crud
+from app.core.db import engine
 from app.core.security import verify_password
 from app.models import User, UserCreate, UserUpdate
 from app.tests.utils.utils import random_email, random_lower_string
@@ -89,3 +92,49 @@ def test_update_user(db: Session) -> None:
     assert user_2
     assert user.email == user_2.email
     assert verify_password(new_password, user_2.hashed_password)
+
+
+def test_get_cached_user_is_served_from_cache(db: Session) -> None:
+    user = crud.create_user(
+        session=db,
+        user_create=UserCreate(email=random_email(), password=random_lower_string()),
+    )
+    crud.invalidate_cached_user(user.id)
+    with Session(engine) as session:
+        cached_user = crud.get_cached_user(session=session, user_id=user.id)
+        assert cached_user
+        assert cached_user.full_name is None
+    # Change the row behind the cache's back: the snapshot is still served
+    user.full_name = "Changed Directly"
+    db.add(user)
+    db.commit()
+    with Session(engine) as session:
+        cached_user = crud.get_cached_user(session=session, user_id=str(user.id))
+        assert cached_user
+        assert cached_user.id == user.id
+        assert cached_user.full_name is None
+    crud.invalidate_cached_user(user.id)
+    with Session(engine) as session:
+        cached_user = crud.get_cached_user(session=session, user_id=user.id)
+        assert cached_user
+        assert cached_user.full_name == "Changed Directly"
+
+
+def test_update_user_invalidates_cached_user(db: Session) -> None:
+    user = crud.create_user(
+        session=db,
+        user_create=UserCreate(email=random_email(), password=random_lower_string()),
+    )
+    with Session(engine) as session:
+        cached_user = crud.get_cached_user(session=session, user_id=user.id)
+        assert cached_user
+        assert cached_user.is_active
+    crud.update_user(session=db, db_user=user, user_in=UserUpdate(is_active=False))
+    with Session(engine) as session:
+        cached_user = crud.get_cached_user(session=session, user_id=user.id)
+        assert cached_user
+        assert not cached_user.is_active
+
+
+def test_get_cached_user_missing(db: Session) -> None:
+    assert crud.get_cached_user(session=db, user_id=uuid.uuid4()) is None
@@ -0,0 +1,269 @@
+import os
+import smtplib
+import stat
+import sys
+from collections.abc import Generator
+from pathlib import Path
+from types import ModuleType, TracebackType
+from unittest.mock import MagicMock, patch
+
+import pytest
+from jinja2 import FileSystemBytecodeCache
+
+from app import utils
+from app.core.config import settings
+from app.tests.utils.pdf import minimal_pdf
+from app.utils import send_email, validate_pdf_integrity
+
+BODY = b"%PDF-1.4\n" + b"1 0 obj\n<< >>\nendobj\n" * 100
+
+
+def write_pdf(tmp_path: Path, content: bytes) -> str:
+    path = tmp_path / "document.pdf"
+    path.write_bytes(content)
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    "trailer",
+    [
+        b"startxref\n100\n%%EOF\n",
+        b"startxref\r\n100\r\n%%EOF",
+        b"startxref 100 %%EOF\n",
+        # Anything after the final %%EOF is ignored, like readers do
+        b"startxref\n100\n%%EOF\n%comment\n",
+        b"startxref\n100\n%%EOF\n\x00\x00",
+        # Incremental update: the last trailer wins
+        b"startxref\n9999999\n%%EOF\nmore\nstartxref\n100\n%%EOF\n",
+    ],
+)
+def test_validate_pdf_integrity_accepts_trailer(tmp_path: Path, trailer: bytes) -> None:
+    assert validate_pdf_integrity(write_pdf(tmp_path, BODY + trailer)) is None
+
+
+@pytest.mark.parametrize(
+    "content, error",
+    [
+        (b"not a pdf" + b"x" * 100, "missing %PDF- header"),
+        (BODY, "missing %%EOF marker"),
+        (BODY + b"%%EOF\n", "missing startxref"),
+        (BODY + b"startxref\nabc\n%%EOF\n", "invalid startxref offset"),
+        (BODY + b"startxref\n0\n%%EOF\n", "invalid startxref offset"),
+        (BODY + b"startxref\n9999999\n%%EOF\n", "invalid startxref offset"),
+        # Only the trailer of the last %%EOF counts
+        (BODY + b"startxref\n100\n%%EOF\n%%EOF\n", "invalid startxref offset"),
+    ],
+)
+def test_validate_pdf_integrity_rejects(
+    tmp_path: Path, content: bytes, error: str
+) -> None:
+    message = validate_pdf_integrity(write_pdf(tmp_path, content))
+    assert message is not None
+    assert error in message
+
+
+def test_validate_pdf_integrity_missing_file(tmp_path: Path) -> None:
+    message = validate_pdf_integrity(str(tmp_path / "missing.pdf"))
+    assert message is not None
+    assert "cannot be read" in message
+
+
+@pytest.fixture
+def page_counter() -> Generator[None, None, None]:
+    # The parser is resolved once per process; re-resolve it around each test
+    utils._get_pdf_page_counter.cache_clear()
+    yield
+    utils._get_pdf_page_counter.cache_clear()
+
+
+@pytest.mark.usefixtures("page_counter")
+def test_validate_pdf_integrity_deep(tmp_path: Path) -> None:
+    assert validate_pdf_integrity(write_pdf(tmp_path, minimal_pdf()), deep=True) is None
+
+
+@pytest.mark.usefixtures("page_counter")
+def test_validate_pdf_integrity_deep_unparseable(tmp_path: Path) -> None:
+    # Passes the structural check, but isn't a parseable document
+    file_path = write_pdf(tmp_path, BODY + b"startxref\n100\n%%EOF\n")
+    assert validate_pdf_integrity(file_path) is None
+    message = validate_pdf_integrity(file_path, deep=True)
+    assert message is not None
+    assert "cannot be read" in message
+
+
+@pytest.mark.usefixtures("page_counter")
+def test_validate_pdf_integrity_deep_without_parser(tmp_path: Path) -> None:
+    no_parsers = {"PyPDF2": None, "pypdfium2": None, "fitz": None}
+    with (
+        patch.dict(sys.modules, no_parsers),
+        patch.object(utils.logger, "warning") as log_warning,
+    ):
+        file_path = write_pdf(tmp_path, BODY + b"startxref\n100\n%%EOF\n")
+        assert validate_pdf_integrity(file_path, deep=True) is None
+    log_warning.assert_called_once()
+
+
+class StubPdfiumDocument:
+    closed: list[str] = []
+
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+
+    def __len__(self) -> int:
+        return 3
+
+    def close(self) -> None:
+        self.closed.append(self.file_path)
+
+
+class StubFitzDocument:
+    def __init__(self, page_count: int) -> None:
+        self.page_count = page_count
+
+    def __enter__(self) -> "StubFitzDocument":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        pass
+
+
+@pytest.mark.usefixtures("page_counter")
+def test_validate_pdf_integrity_deep_pypdfium2(tmp_path: Path) -> None:
+    pdfium = ModuleType("pypdfium2")
+    pdfium.PdfDocument = StubPdfiumDocument  # type: ignore[attr-defined]
+    file_path = write_pdf(tmp_path, minimal_pdf())
+    with patch.dict(sys.modules, {"PyPDF2": None, "pypdfium2": pdfium}):
+        assert validate_pdf_integrity(file_path, deep=True) is None
+    assert StubPdfiumDocument.closed == [file_path]
+
+
+@pytest.mark.usefixtures("page_counter")
+@pytest.mark.parametrize("page_count, valid", [(2, True), (0, False)])
+def test_validate_pdf_integrity_deep_fitz(
+    tmp_path: Path, page_count: int, valid: bool
+) -> None:
+    fitz = ModuleType("fitz")
+    fitz_open = MagicMock(return_value=StubFitzDocument(page_count))
+    fitz.open = fitz_open  # type: ignore[attr-defined]
+    file_path = write_pdf(tmp_path, minimal_pdf())
+    with patch.dict(sys.modules, {"PyPDF2": None, "pypdfium2": None, "fitz": fitz}):
+        message = validate_pdf_integrity(file_path, deep=True)
+    fitz_open.assert_called_once_with(file_path, filetype="pdf")
+    if valid:
+        assert message is None
+    else:
+        assert message is not None
+        assert "no pages found" in message
+
+
+@pytest.fixture
+def smtp_settings(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "SMTP_HOST", "smtp.example.com")
+    monkeypatch.setattr(settings, "EMAILS_FROM_EMAIL", "admin@example.com")
+    monkeypatch.setattr(utils, "_smtp_client", None)
+    # emails subclasses smtplib.SMTP on import, so load it before patching
+    utils._get_base_message()
+
+
+@pytest.mark.usefixtures("smtp_settings")
+def test_send_email_reuses_connection() -> None:
+    with patch("app.utils.smtplib.SMTP") as smtp:
+        send_email(email_to="a@example.com", subject="one", html_content="<p>1</p>")
+        send_email(email_to="b@example.com", subject="two", html_content="<p>2</p>")
+    smtp.assert_called_once_with("smtp.example.com", settings.SMTP_PORT, timeout=5)
+    client = smtp.return_value
+    assert client.sendmail.call_count == 2
+    assert client.sendmail.call_args.args[:2] == (
+        "admin@example.com",
+        ["b@example.com"],
+    )
+
+
+@pytest.mark.usefixtures("smtp_settings")
+def test_send_email_reconnects_after_disconnect() -> None:
+    stale, fresh = MagicMock(), MagicMock()
+    stale.sendmail.side_effect = smtplib.SMTPServerDisconnected()
+    with patch("app.utils.smtplib.SMTP", side_effect=[stale, fresh]):
+        send_email(email_to="a@example.com", subject="one", html_content="<p>1</p>")
+        send_email(email_to="a@example.com", subject="two", html_content="<p>2</p>")
+    stale.close.assert_called_once()
+    assert fresh.sendmail.call_count == 2
+
+
+@pytest.mark.usefixtures("smtp_settings")
+def test_send_email_failure_is_logged_not_raised() -> None:
+    with (
+        patch("app.utils.smtplib.SMTP", side_effect=OSError("unreachable")),
+        patch.object(utils.logger, "error") as log_error,
+    ):
+        send_email(email_to="a@example.com", subject="one", html_content="<p>1</p>")
+    log_error.assert_called_once()
+
+
+@pytest.mark.usefixtures("smtp_settings")
+def test_send_email_drops_connection_after_error() -> None:
+    broken, fresh = MagicMock(), MagicMock()
+    broken.sendmail.side_effect = TimeoutError()
+    with patch("app.utils.smtplib.SMTP", side_effect=[broken, fresh]):
+        send_email(email_to="a@example.com", subject="one", html_content="<p>1</p>")
+        broken.close.assert_called_once()
+        send_email(email_to="a@example.com", subject="two", html_content="<p>2</p>")
+    fresh.sendmail.assert_called_once()
+
+
+def test_bytecode_cache_default_dir(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "JINJA_BYTECODE_CACHE_DIR", None)
+    cache = utils._get_bytecode_cache()
+    assert isinstance(cache, FileSystemBytecodeCache)
+    # Jinja's own per-user directory
+    assert cache.directory == FileSystemBytecodeCache().directory
+
+
+def test_bytecode_cache_private_dir(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir(mode=0o700)
+    monkeypatch.setattr(settings, "JINJA_BYTECODE_CACHE_DIR", str(cache_dir))
+    cache = utils._get_bytecode_cache()
+    assert isinstance(cache, FileSystemBytecodeCache)
+    assert cache.directory == str(cache_dir)
+
+
+def test_bytecode_cache_creates_private_dir(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(settings, "JINJA_BYTECODE_CACHE_DIR", str(cache_dir))
+    assert isinstance(utils._get_bytecode_cache(), FileSystemBytecodeCache)
+    assert stat.S_IMODE(cache_dir.stat().st_mode) & 0o077 == 0
+
+
+def test_bytecode_cache_rejects_shared_dir(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    os.chmod(cache_dir, 0o755)
+    monkeypatch.setattr(settings, "JINJA_BYTECODE_CACHE_DIR", str(cache_dir))
+    with patch.object(utils.logger, "warning") as log_warning:
+        assert utils._get_bytecode_cache() is None
+    log_warning.assert_called_once()
+
+
+def test_bytecode_cache_rejects_symlink(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    target = tmp_path / "target"
+    target.mkdir(mode=0o700)
+    link = tmp_path / "cache"
+    link.symlink_to(target, target_is_directory=True)
+    monkeypatch.setattr(settings, "JINJA_BYTECODE_CACHE_DIR", str(link))
+    with patch.object(utils.logger, "warning") as log_warning:
+        assert utils._get_bytecode_cache() is None
+    log_warning.assert_called_once()
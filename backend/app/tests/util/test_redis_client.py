@@ -0,0 +1,120 @@
+import logging
+import time
+import uuid
+
+import pytest
+
+from app.util.redis_client import (
+    MockRedisClient,
+    RateLimitFilter,
+    RedisSlot,
+    rdb,
+    try_acquire_slots,
+)
+
+
+def random_key() -> str:
+    return f"test:slots:{uuid.uuid4()}"
+
+
+def test_acquire_up_to_limit() -> None:
+    key = random_key()
+    slots = [try_acquire_slots([(key, 3, 60)]) for _ in range(3)]
+    assert all(slot is not None for slot in slots)
+    assert rdb.zcard(key) == 3
+    assert try_acquire_slots([(key, 3, 60)]) is None
+
+
+def test_rejected_acquire_does_not_take_any_slot() -> None:
+    open_key = random_key()
+    full_key = random_key()
+    assert try_acquire_slots([(full_key, 1, 60)])
+
+    assert try_acquire_slots([(open_key, 5, 60), (full_key, 1, 60)]) is None
+    assert rdb.zcard(open_key) == 0
+    assert rdb.zcard(full_key) == 1
+
+
+def test_release_frees_slot() -> None:
+    key = random_key()
+    slot = try_acquire_slots([(key, 1, 60)])
+    assert slot
+    assert try_acquire_slots([(key, 1, 60)]) is None
+
+    slot.release()
+    assert rdb.zcard(key) == 0
+    assert try_acquire_slots([(key, 1, 60)])
+
+
+def test_release_only_removes_own_member() -> None:
+    key = random_key()
+    first = try_acquire_slots([(key, 2, 60)])
+    second = try_acquire_slots([(key, 2, 60)])
+    assert first and second
+
+    first.release()
+    assert rdb.zcard(key) == 1
+    second.release()
+    assert rdb.zcard(key) == 0
+
+
+def test_stale_members_are_pruned_after_ttl(monkeypatch: pytest.MonkeyPatch) -> None:
+    key = random_key()
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    # Never released, e.g. the worker died mid-request
+    assert try_acquire_slots([(key, 1, 10)])
+    assert try_acquire_slots([(key, 1, 10)]) is None
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert try_acquire_slots([(key, 1, 10)])
+    assert rdb.zcard(key) == 1
+
+
+def test_empty_slots_is_minimum_across_limits() -> None:
+    route_key = random_key()
+    global_key = random_key()
+    limits = [(route_key, 5, 60), (global_key, 3, 60)]
+    slot = RedisSlot(limits)
+    assert slot.empty_slots == 3
+
+    assert slot.acquire()
+    assert slot.empty_slots == 2
+    assert try_acquire_slots([(global_key, 3, 60)])
+    assert slot.empty_slots == 1
+
+    slot.release()
+    assert slot.empty_slots == 2
+
+
+def test_empty_slots_without_limits() -> None:
+    assert RedisSlot([]).empty_slots == 0
+
+
+def test_sorted_set_commands() -> None:
+    client = MockRedisClient()
+    assert client.zadd("z", {"a": 1.0, "b": 2.0, "c": 3.0}) == 3
+    # Re-scoring an existing member doesn't add a new one
+    assert client.zadd("z", {"a": 4.0}) == 0
+    assert client.zcard("z") == 3
+    assert client.zremrangebyscore("z", 0, 2.5) == 1
+    assert client.zrem("z", "a", "missing") == 1
+    assert client.zcard("z") == 1
+    assert client.zrem("z", "c") == 1
+    assert client.zcard("z") == 0
+
+
+def test_rate_limit_filter(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = 1000.0
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    rate_limit = RateLimitFilter(max_per_sec=10)
+    record = logging.makeLogRecord({"msg": "slot release failed"})
+
+    assert all(rate_limit.filter(record) for _ in range(10))
+    now += 0.5
+    assert not rate_limit.filter(record)
+
+    # A new window starts a second after the previous one began
+    now += 0.5
+    assert all(rate_limit.filter(record) for _ in range(10))
+    assert not rate_limit.filter(record)
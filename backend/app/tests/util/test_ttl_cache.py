@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from app.util.ttl_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    fake = FakeClock()
+    monkeypatch.setattr(time, "monotonic", fake)
+    return fake
+
+
+def test_get_missing_key_returns_default() -> None:
+    cache = TTLCache(maxsize=2, ttl=10)
+    assert cache.get("missing") is None
+    assert cache.get("missing", "default") == "default"
+
+
+def test_entry_expires_after_ttl(clock: FakeClock) -> None:
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("key", "value")
+    clock.now += 9
+    assert cache.get("key") == "value"
+    clock.now += 1
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_entry_ttl_is_capped_by_default_ttl(clock: FakeClock) -> None:
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("key", "value", ttl=60)
+    clock.now += 10
+    assert cache.get("key") is None
+
+
+def test_entry_ttl_shorter_than_default(clock: FakeClock) -> None:
+    # e.g. a token whose exp claim is closer than the cache TTL
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("key", "value", ttl=5)
+    clock.now += 5
+    assert cache.get("key") is None
+
+
+def test_non_positive_ttl_is_not_stored() -> None:
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("zero", "value", ttl=0)
+    cache.set("negative", "value", ttl=-1)
+    assert cache.get("zero") is None
+    assert cache.get("negative") is None
+    assert len(cache) == 0
+
+
+def test_oldest_entry_is_evicted_when_full() -> None:
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_resetting_key_does_not_evict() -> None:
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("a", 3)
+    assert cache.get("a") == 3
+    assert cache.get("b") == 2
+
+
+def test_pop_and_clear() -> None:
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.pop("a") == 1
+    assert cache.pop("a", "gone") == "gone"
+    cache.clear()
+    assert len(cache) == 0
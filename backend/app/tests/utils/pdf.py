@@ -0,0 +1,41 @@
+from sqlmodel import Session
+
+from app.models import PDFDocument
+from app.tests.utils.user import create_random_user
+from app.tests.utils.utils import random_lower_string
+
+
+def minimal_pdf() -> bytes:
+    """Return a valid one-page PDF with a correct cross-reference table."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >>",
+    ]
+    content = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(content))
+        content += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref_offset = len(content)
+    content += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        content += b"%010d 00000 n \n" % offset
+    content += b"trailer\n<< /Size %d /Root 1 0 R >>\n" % (len(objects) + 1)
+    content += b"startxref\n%d\n%%%%EOF\n" % xref_offset
+    return content
+
+
+def create_random_pdf_document(db: Session, title: str | None = None) -> PDFDocument:
+    user = create_random_user(db)
+    pdf_document = PDFDocument(
+        title=title or random_lower_string(),
+        filename=f"/nonexistent/{random_lower_string()}.pdf",
+        file_size=0,
+        page_count=0,
+        owner_id=user.id,
+    )
+    db.add(pdf_document)
+    db.commit()
+    db.refresh(pdf_document)
+    return pdf_document
@@ -1,76 +1,334 @@
 import time
+import logging
 import threading
-from typing import List, Tuple, Optional, Dict, Any
+import secrets
+import heapq
+from bisect import bisect_left, bisect_right, insort
+from contextlib import ExitStack, contextmanager
+from operator import itemgetter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from fastapi import HTTPException
 
 
+class RateLimitFilter(logging.Filter):
+    """
+    Logging filter that drops records beyond max_per_sec per second, so a
+    flood of failures can't serialize workers behind the log handlers.
+    """
+
+    def __init__(self, max_per_sec: int):
+        super().__init__()
+        self.max_per_sec = max_per_sec
+        self._window_start = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._window_start >= 1:
+                self._window_start = now
+                self._count = 0
+            self._count += 1
+            return self._count <= self.max_per_sec
+
+
+logger = logging.getLogger(__name__)
+logger.addFilter(RateLimitFilter(max_per_sec=10))
+
+# Number of keyspace shards; must be a power of two
+_NUM_SHARDS = 16
+
+
+class _Shard:
+    """
+    A slice of the mock keyspace guarded by its own lock, so operations on
+    unrelated keys don't serialize behind a single process-wide mutex.
+    """
+
+    __slots__ = ("data", "expiry", "expiry_heap", "lock")
+
+    def __init__(self) -> None:
+        self.data: Dict[str, Any] = {}
+        self.expiry: Dict[str, float] = {}
+        # Min-heap of (expiry_time, key); entries superseded by a later
+        # expire() or by key deletion are skipped when popped
+        self.expiry_heap: List[Tuple[float, str]] = []
+        self.lock = threading.Lock()
+
+
+class _SortedSet:
+    """
+    Members ordered by score, backing the mock sorted set commands.
+    """
+
+    __slots__ = ("scores", "entries")
+
+    def __init__(self) -> None:
+        self.scores: Dict[str, float] = {}
+        self.entries: List[Tuple[float, str]] = []  # (score, member), sorted
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, member: str, score: float) -> int:
+        """Add or re-score a member, returning 1 if it is new"""
+        old_score = self.scores.get(member)
+        if old_score is not None:
+            self.entries.remove((old_score, member))
+        self.scores[member] = score
+        insort(self.entries, (score, member))
+        return 0 if old_score is not None else 1
+
+    def remove(self, member: str) -> int:
+        """Remove a member, returning 1 if it existed"""
+        score = self.scores.pop(member, None)
+        if score is None:
+            return 0
+        self.entries.remove((score, member))
+        return 1
+
+    def remove_range_by_score(self, min_score: float, max_score: float) -> int:
+        """Remove members with min_score <= score <= max_score"""
+        lo = bisect_left(self.entries, min_score, key=itemgetter(0))
+        hi = bisect_right(self.entries, max_score, key=itemgetter(0))
+        for _, member in self.entries[lo:hi]:
+            del self.scores[member]
+        del self.entries[lo:hi]
+        return hi - lo
+
+
 class MockRedisClient:
     """
     Mock Redis client that simulates Redis operations using in-memory storage.
     Thread-safe implementation for concurrent operations.
     """
     
-    def __init__(self):
-        self._data: Dict[str, Any] = {}
-        self._expiry: Dict[str, float] = {}
-        self._lock = threading.RLock()
-    
-    def _cleanup_expired(self):
-        """Remove expired keys"""
-        current_time = time.time()
-        expired_keys = [
-            key for key, expiry_time in self._expiry.items() 
-            if expiry_time <= current_time
-        ]
-        for key in expired_keys:
-            self._data.pop(key, None)
-            self._expiry.pop(key, None)
+    def __init__(self) -> None:
+        self._shards = [_Shard() for _ in range(_NUM_SHARDS)]
+        self._local = threading.local()
+    
+    def _shard_index(self, key: str) -> int:
+        """Return the index of the shard owning a key"""
+        return hash(key) & (_NUM_SHARDS - 1)
+    
+    def _shard(self, key: str) -> _Shard:
+        """Return the shard owning a key"""
+        return self._shards[self._shard_index(key)]
+    
+    @contextmanager
+    def _lock_shards(self, keys: List[str]) -> Iterator[List[_Shard]]:
+        """
+        Lock the shards owning the given keys and drop their expired keys.
+        
+        Shards are always locked in ascending order so concurrent callers
+        can't deadlock. Yields the owning shard of each key, in key order.
+        """
+        indexes = [self._shard_index(key) for key in keys]
+        with ExitStack() as stack:
+            for index in sorted(set(indexes)):
+                shard = self._shards[index]
+                stack.enter_context(shard.lock)
+                self._cleanup_expired(shard)
+            yield [self._shards[index] for index in indexes]
+    
+    @staticmethod
+    def _cleanup_expired(shard: _Shard) -> None:
+        """Remove expired keys from a shard. Caller must hold the shard lock."""
+        current_time = time.monotonic()
+        heap = shard.expiry_heap
+        while heap and heap[0][0] <= current_time:
+            expiry_time, key = heapq.heappop(heap)
+            if shard.expiry.get(key) == expiry_time:
+                shard.data.pop(key, None)
+                del shard.expiry[key]
+    
+    @staticmethod
+    def _incr(shard: _Shard, key: str) -> int:
+        current_value = shard.data.get(key, 0)
+        new_value = int(current_value) + 1
+        shard.data[key] = new_value
+        return new_value
+    
+    @staticmethod
+    def _decr(shard: _Shard, key: str) -> int:
+        current_value = shard.data.get(key, 0)
+        new_value = max(int(current_value) - 1, 0)  # Don't go below 0
+        shard.data[key] = new_value
+        return new_value
+    
+    @staticmethod
+    def _expire(shard: _Shard, key: str, seconds: int) -> bool:
+        if key in shard.data:
+            expiry_time = time.monotonic() + seconds
+            shard.expiry[key] = expiry_time
+            heapq.heappush(shard.expiry_heap, (expiry_time, key))
+            return True
+        return False
+    
+    @staticmethod
+    def _drop_if_empty(shard: _Shard, key: str) -> None:
+        # Like Redis, a sorted set with no members no longer exists
+        zset: Optional[_SortedSet] = shard.data.get(key)
+        if zset is not None and not zset:
+            del shard.data[key]
+            shard.expiry.pop(key, None)
+    
+    @staticmethod
+    def _zadd(shard: _Shard, key: str, mapping: Dict[str, float]) -> int:
+        zset: Optional[_SortedSet] = shard.data.get(key)
+        if zset is None:
+            zset = shard.data[key] = _SortedSet()
+        return sum(zset.add(member, score) for member, score in mapping.items())
+    
+    @classmethod
+    def _zrem(cls, shard: _Shard, key: str, *members: str) -> int:
+        zset: Optional[_SortedSet] = shard.data.get(key)
+        if zset is None:
+            return 0
+        removed = sum(zset.remove(member) for member in members)
+        cls._drop_if_empty(shard, key)
+        return removed
+    
+    @classmethod
+    def _zremrangebyscore(
+        cls, shard: _Shard, key: str, min_score: float, max_score: float
+    ) -> int:
+        zset: Optional[_SortedSet] = shard.data.get(key)
+        if zset is None:
+            return 0
+        removed = zset.remove_range_by_score(min_score, max_score)
+        cls._drop_if_empty(shard, key)
+        return removed
+    
+    @staticmethod
+    def _zcard(shard: _Shard, key: str) -> int:
+        zset: Optional[_SortedSet] = shard.data.get(key)
+        return len(zset) if zset is not None else 0
     
     def incr(self, key: str) -> int:
         """Increment the value of a key by 1"""
-        with self._lock:
-            self._cleanup_expired()
-            current_value = self._data.get(key, 0)
-            new_value = int(current_value) + 1
-            self._data[key] = new_value
-            return new_value
+        shard = self._shard(key)
+        with shard.lock:
+            self._cleanup_expired(shard)
+            return self._incr(shard, key)
     
     def decr(self, key: str) -> int:
         """Decrement the value of a key by 1"""
-        with self._lock:
-            self._cleanup_expired()
-            current_value = self._data.get(key, 0)
-            new_value = max(int(current_value) - 1, 0)  # Don't go below 0
-            self._data[key] = new_value
-            return new_value
+        shard = self._shard(key)
+        with shard.lock:
+            self._cleanup_expired(shard)
+            return self._decr(shard, key)
     
     def expire(self, key: str, seconds: int) -> bool:
         """Set expiry time for a key"""
-        with self._lock:
-            if key in self._data:
-                self._expiry[key] = time.time() + seconds
-                return True
-            return False
+        shard = self._shard(key)
+        with shard.lock:
+            return self._expire(shard, key, seconds)
     
     def get(self, key: str) -> Optional[str]:
         """Get the value of a key"""
-        with self._lock:
-            self._cleanup_expired()
-            return self._data.get(key)
+        shard = self._shard(key)
+        with shard.lock:
+            self._cleanup_expired(shard)
+            return shard.data.get(key)
     
     def mget(self, keys: List[str]) -> List[Optional[str]]:
-        """Get multiple keys at once"""
-        with self._lock:
-            self._cleanup_expired()
-            return [self._data.get(key) for key in keys]
+        """Get multiple keys at once, locking each involved shard once"""
+        results: List[Optional[str]] = [None] * len(keys)
+        by_shard: Dict[int, List[int]] = {}
+        for i, key in enumerate(keys):
+            by_shard.setdefault(self._shard_index(key), []).append(i)
+        for index, positions in by_shard.items():
+            shard = self._shards[index]
+            with shard.lock:
+                self._cleanup_expired(shard)
+                for i in positions:
+                    results[i] = shard.data.get(keys[i])
+        return results
+    
+    def zadd(self, key: str, mapping: Dict[str, float]) -> int:
+        """Add members with scores to a sorted set"""
+        shard = self._shard(key)
+        with shard.lock:
+            self._cleanup_expired(shard)
+            return self._zadd(shard, key, mapping)
+    
+    def zrem(self, key: str, *members: str) -> int:
+        """Remove members from a sorted set"""
+        shard = self._shard(key)
+        with shard.lock:
+            self._cleanup_expired(shard)
+            return self._zrem(shard, key, *members)
+    
+    def zremrangebyscore(self, key: str, min_score: float, max_score: float) -> int:
+        """Remove sorted set members with scores within [min_score, max_score]"""
+        shard = self._shard(key)
+        with shard.lock:
+            self._cleanup_expired(shard)
+            return self._zremrangebyscore(shard, key, min_score, max_score)
+    
+    def zcard(self, key: str) -> int:
+        """Get the number of members in a sorted set"""
+        shard = self._shard(key)
+        with shard.lock:
+            self._cleanup_expired(shard)
+            return self._zcard(shard, key)
+    
+    def try_acquire_slots_atomic(
+        self, limits: List[Tuple[str, int, int]], member: str
+    ) -> Optional[List[int]]:
+        """
+        Atomically register a request in a set of concurrency sorted sets if
+        all limits fit.
+        
+        Equivalent to a single Lua script on a real Redis: per key,
+        ZREMRANGEBYSCORE drops members older than the key's window and ZCARD
+        checks the limit; only if every limit fits are ZADD and EXPIRE
+        applied, so a rejected attempt never mutates anything.
+        
+        Args:
+            limits: List of tuples containing (key, max_concurrent, ttl), where
+                    ttl is also the window after which a member is stale
+            member: Unique id of the request taking the slots
+            
+        Returns:
+            The resulting set sizes, or None if any limit is reached
+        """
+        keys = [key for key, _, _ in limits]
+        now = time.monotonic()
+        with self._lock_shards(keys) as shards:
+            counts = []
+            for shard, (key, max_allowed, ttl) in zip(shards, limits):
+                self._zremrangebyscore(shard, key, float("-inf"), now - ttl)
+                count = self._zcard(shard, key)
+                if count >= max_allowed:
+                    return None
+                counts.append(count)
+            # The resulting sizes follow from the counts already read
+            counters = []
+            for shard, (key, _, ttl), count in zip(shards, limits, counts):
+                counters.append(count + self._zadd(shard, key, {member: now}))
+                self._expire(shard, key, ttl)
+            return counters
     
     def ping(self) -> bool:
         """Test connection (always returns True for mock)"""
         return True
     
-    def pipeline(self):
-        """Return a pipeline context manager"""
-        return MockRedisPipeline(self)
+    def pipeline(self) -> "MockRedisPipeline":
+        """
+        Return a pipeline context manager.
+        
+        Each thread reuses a single pipeline instance, reset on every call.
+        Pipelines are only used within one `with` block at a time, so a
+        thread never needs two of them at once.
+        """
+        pipe = getattr(self._local, "pipeline", None)
+        if pipe is None:
+            pipe = self._local.pipeline = MockRedisPipeline(self)
+        pipe._operations.clear()
+        return pipe
 
 
 class MockRedisPipeline:
@@ -80,46 +338,66 @@ class MockRedisPipeline:
     
     def __init__(self, client: MockRedisClient):
         self._client = client
-        self._operations: List[Tuple[str, str, Tuple]] = []  # (method, key, args)
+        self._operations: List[Tuple[str, str, Tuple[Any, ...]]] = []  # (method, key, args)
     
-    def incr(self, key: str):
+    def incr(self, key: str) -> "MockRedisPipeline":
         """Queue an increment operation"""
         self._operations.append(('incr', key, ()))
         return self
     
-    def decr(self, key: str):
+    def decr(self, key: str) -> "MockRedisPipeline":
         """Queue a decrement operation"""
         self._operations.append(('decr', key, ()))
         return self
     
-    def expire(self, key: str, seconds: int):
+    def expire(self, key: str, seconds: int) -> "MockRedisPipeline":
         """Queue an expire operation"""
         self._operations.append(('expire', key, (seconds,)))
         return self
     
+    def zadd(self, key: str, mapping: Dict[str, float]) -> "MockRedisPipeline":
+        """Queue a sorted set add operation"""
+        self._operations.append(('zadd', key, (mapping,)))
+        return self
+    
+    def zrem(self, key: str, *members: str) -> "MockRedisPipeline":
+        """Queue a sorted set remove operation"""
+        self._operations.append(('zrem', key, members))
+        return self
+    
+    def zremrangebyscore(self, key: str, min_score: float, max_score: float) -> "MockRedisPipeline":
+        """Queue a sorted set remove-by-score operation"""
+        self._operations.append(('zremrangebyscore', key, (min_score, max_score)))
+        return self
+    
+    def zcard(self, key: str) -> "MockRedisPipeline":
+        """Queue a sorted set cardinality operation"""
+        self._operations.append(('zcard', key, ()))
+        return self
+    
     def execute(self) -> List[Any]:
-        """Execute all queued operations atomically"""
-        with self._client._lock:
+        """
+        Execute all queued operations atomically.
+        
+        Only the shards touched by the queued keys are locked, always in
+        ascending shard order so concurrent pipelines can't deadlock.
+        """
+        client = self._client
+        with client._lock_shards([key for _, key, _ in self._operations]) as shards:
             results = []
-            for method, key, args in self._operations:
-                if method == 'incr':
-                    result = self._client.incr(key)
-                elif method == 'decr':
-                    result = self._client.decr(key)
-                elif method == 'expire':
-                    result = self._client.expire(key, *args)
-                else:
-                    result = None
+            for shard, (method, key, args) in zip(shards, self._operations):
+                # Queued methods map onto the client's unlocked helpers
+                result = getattr(client, f"_{method}")(shard, key, *args)
                 results.append(result)
             self._operations.clear()
             return results
     
-    def __enter__(self):
+    def __enter__(self) -> "MockRedisPipeline":
         return self
     
-    def __exit__(self, exc_type, exc_val, exc_tb):
+    def __exit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
         if exc_type is None:
-            return self.execute()
+            self.execute()
 
 
 # Global mock Redis instances
@@ -133,6 +411,10 @@ class RedisSlot:
     
     This class handles acquiring and releasing slots for rate limiting based on
     multiple concurrent limits (e.g., per-route and global limits).
+    
+    Each limit is a sorted set of in-flight request ids scored by start time.
+    Members older than the limit's TTL are treated as stale and pruned on the
+    next acquire, so a worker dying before release() can't leak a slot.
     """
     
     def __init__(self, limits: List[Tuple[str, int, int]]):
@@ -147,6 +429,7 @@ class RedisSlot:
         """
         self.limits = limits
         self.keys = [key for key, _, _ in limits]
+        self.member = secrets.token_hex(8)
 
     def acquire(self) -> Optional["RedisSlot"]:
         """
@@ -159,56 +442,25 @@ class RedisSlot:
             HTTPException: If Redis operations fail
         """
         try:
-            # Increment all counters atomically
-            with rdb.pipeline() as pipe:
-                for key, _, _ in self.limits:
-                    pipe.incr(key)
-                results = pipe.execute()
-
-            over_limit = False
-            keys_to_expire: List[Tuple[str, int]] = []
-
-            # Check if any limit is exceeded
-            for i, (key, max_allowed, ttl) in enumerate(self.limits):
-                current = results[i]
-                if current > max_allowed:
-                    over_limit = True
-                elif current == 1:
-                    # This is the first increment, set TTL
-                    keys_to_expire.append((key, ttl))
-
-            if over_limit:
-                # Rollback all increments
-                with rdb.pipeline() as pipe:
-                    for key, _, _ in self.limits:
-                        pipe.decr(key)
-                    pipe.execute()
+            if rdb.try_acquire_slots_atomic(self.limits, self.member) is None:
                 return None
-
-            # Set TTL for new keys
-            if keys_to_expire:
-                with rdb.pipeline() as pipe:
-                    for key, ttl in keys_to_expire:
-                        pipe.expire(key, ttl)
-                    pipe.execute()
-
             return self
         except Exception as e:
             raise HTTPException(500, f"Failed to acquire redis slot: {e}")
 
-    def release(self):
+    def release(self) -> None:
         """
-        Release all acquired slots by decrementing counters.
+        Release all acquired slots by removing this request from every set.
         """
         try:
             with rdb.pipeline() as pipe:
                 for key in self.keys:
-                    pipe.decr(key)
+                    pipe.zrem(key, self.member)
                 pipe.execute()
         except Exception as e:
             # Log the error but don't raise - we don't want to break the response
             # just because we couldn't release the slot
-            print(f"Warning: Failed to release redis slot: {e}")
+            logger.warning("Failed to release redis slot: %s", e)
 
     @property
     def empty_slots(self) -> int:
@@ -222,15 +474,18 @@ class RedisSlot:
             HTTPException: If Redis operations fail
         """
         try:
-            current_values = rdb.mget(self.keys)
-            min_available = float("inf")
-            
-            for (key, max_allowed, _), current in zip(self.limits, current_values):
-                current_int = int(current or 0)
-                available = max(max_allowed - current_int, 0)
-                min_available = min(min_available, available)
-                
-            return min_available if min_available != float("inf") else 0
+            with rdb.pipeline() as pipe:
+                for key in self.keys:
+                    pipe.zcard(key)
+                current_values = pipe.execute()
+            # ZCARD already returns ints, so no coercion is needed
+            return min(
+                (
+                    max(max_allowed - current, 0)
+                    for (_, max_allowed, _), current in zip(self.limits, current_values)
+                ),
+                default=0,
+            )
         except Exception as e:
             raise HTTPException(500, f"Failed to get empty_slots: {e}")
 
@@ -1,20 +1,106 @@
+import base64
+import functools
+import hmac
+import json
 import logging
+import os
+import re
+import smtplib
+import stat
+import threading
+import time
 from dataclasses import dataclass
-from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 
-import emails  # type: ignore
 import jwt
-from jinja2 import Template
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    select_autoescape,
+)
 from jwt.exceptions import InvalidTokenError
 
 from app.core import security
 from app.core.config import settings
+from app.util.ttl_cache import TTLCache
 
-logging.basicConfig(level=logging.INFO)
+if not logging.getLogger().handlers:
+    logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_TEMPLATES_DIR = str(Path(__file__).resolve().parent / "email-templates" / "build")
+
+
+def _get_bytecode_cache() -> FileSystemBytecodeCache | None:
+    """
+    Cache compiled templates on disk so new worker processes skip compiling
+    them. Bytecode is executed when loaded, so the directory must be private
+    to this user; otherwise templates are simply compiled in memory.
+    """
+    cache_dir = settings.JINJA_BYTECODE_CACHE_DIR
+    try:
+        if cache_dir is None:
+            # Jinja's default directory is per-user, 0700 and ownership-checked
+            return FileSystemBytecodeCache()
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        st = os.lstat(cache_dir)
+    except (OSError, RuntimeError) as e:
+        logger.warning("Email template bytecode cache disabled: %s", e)
+        return None
+    if (
+        not stat.S_ISDIR(st.st_mode)
+        or st.st_uid != os.getuid()
+        or stat.S_IMODE(st.st_mode) & 0o077
+    ):
+        logger.warning(
+            "Email template bytecode cache disabled: %s is not a private "
+            "directory owned by this user",
+            cache_dir,
+        )
+        return None
+    return FileSystemBytecodeCache(cache_dir)
+
+
+# Templates are parsed and compiled once, then served from the environment's
+# cache; they only change on deploy, so no reload checks are needed. Built on
+# first use so importing this module has no filesystem side effects.
+@functools.cache
+def _get_jinja_env() -> Environment:
+    return Environment(
+        loader=FileSystemLoader(_TEMPLATES_DIR),
+        bytecode_cache=_get_bytecode_cache(),
+        autoescape=select_autoescape(["html"]),
+        auto_reload=False,
+        cache_size=-1,
+    )
+
+
+# Values that are fixed for the process lifetime, resolved once at import
+_PROJECT_NAME = settings.PROJECT_NAME
+_FRONTEND_HOST = settings.FRONTEND_HOST
+_EMAIL_RESET_HOURS = settings.EMAIL_RESET_TOKEN_EXPIRE_HOURS
+_EMAIL_RESET_SECONDS = int(_EMAIL_RESET_HOURS * 3600)
+_RESET_LINK_PREFIX = f"{_FRONTEND_HOST}/reset-password?token="
+_TEST_EMAIL_SUBJECT = f"{_PROJECT_NAME} - Test email"
+_RESET_PASSWORD_SUBJECT_PREFIX = f"{_PROJECT_NAME} - Password recovery for user "
+_NEW_ACCOUNT_SUBJECT_PREFIX = f"{_PROJECT_NAME} - New account for user "
+
+# Reset-token signing material, prepared once. security.ALGORITHM is an HMAC
+# algorithm, so the prepared key is just the secret's bytes.
+_JWT_ALG = security.ALGORITHM
+_JWT_ALGS = [security.ALGORITHM]
+_JWT_KEY = settings.SECRET_KEY.encode()
+
+
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+# Pre-encoded header for signing HS256 tokens inline, as PyJWT would emit it
+_HS256_HEADER_B64 = _b64url(b'{"alg":"HS256","typ":"JWT"}')
+
 
 @dataclass
 class EmailData:
@@ -23,13 +109,83 @@ class EmailData:
 
 
 def render_email_template(*, template_name: str, context: dict[str, Any]) -> str:
-    template_str = (
-        Path(__file__).parent / "email-templates" / "build" / template_name
-    ).read_text()
-    html_content = Template(template_str).render(context)
+    html_content = _get_jinja_env().get_template(template_name).render(context)
     return html_content
 
 
+_MAIL_FROM = (settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL)
+
+# A single Message is reused for every send, only its subject, body and
+# recipient change. It is submitted over one persistent SMTP connection so
+# the TCP/TLS handshake and login happen once rather than per email; the
+# lock serializes the background tasks sharing both
+_message_lock = threading.Lock()
+_smtp_client: Optional[smtplib.SMTP] = None
+
+
+@functools.cache
+def _get_base_message() -> Any:
+    # Imported lazily: most processes never send mail
+    import emails  # type: ignore
+
+    return emails.Message(mail_from=_MAIL_FROM)
+
+
+# Same socket timeout the emails library used, so a stalled server can't hold
+# the message lock (and the threads queued behind it) indefinitely
+_SMTP_TIMEOUT = 5
+
+
+def _connect_smtp() -> smtplib.SMTP:
+    assert settings.SMTP_HOST
+    client: smtplib.SMTP
+    if settings.SMTP_SSL and not settings.SMTP_TLS:
+        client = smtplib.SMTP_SSL(
+            settings.SMTP_HOST, settings.SMTP_PORT, timeout=_SMTP_TIMEOUT
+        )
+    else:
+        client = smtplib.SMTP(
+            settings.SMTP_HOST, settings.SMTP_PORT, timeout=_SMTP_TIMEOUT
+        )
+    try:
+        if settings.SMTP_TLS:
+            client.starttls()
+        if settings.SMTP_USER and settings.SMTP_PASSWORD:
+            client.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+    except BaseException:
+        client.close()
+        raise
+    return client
+
+
+def _reset_smtp() -> None:
+    global _smtp_client
+    if _smtp_client is not None:
+        _smtp_client.close()
+        _smtp_client = None
+
+
+def _send_message(mail_from: str, email_to: str, message: str) -> dict[str, Any]:
+    """
+    Send over the persistent connection, reconnecting once if it was dropped.
+    On any failure the connection is discarded, so the next send starts over.
+    """
+    global _smtp_client
+    try:
+        if _smtp_client is None:
+            _smtp_client = _connect_smtp()
+        try:
+            return _smtp_client.sendmail(mail_from, [email_to], message)
+        except smtplib.SMTPServerDisconnected:
+            # Servers drop idle connections; that's expected between sends
+            _reset_smtp()
+            _smtp_client = _connect_smtp()
+            return _smtp_client.sendmail(mail_from, [email_to], message)
+    except (smtplib.SMTPException, OSError):
+        _reset_smtp()
+        raise
+
+
 def send_email(
     *,
     email_to: str,
@@ -37,45 +193,43 @@ def send_email(
     html_content: str = "",
 ) -> None:
     assert settings.emails_enabled, "no provided configuration for email variables"
-    message = emails.Message(
-        subject=subject,
-        html=html_content,
-        mail_from=(settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL),
-    )
-    smtp_options = {"host": settings.SMTP_HOST, "port": settings.SMTP_PORT}
-    if settings.SMTP_TLS:
-        smtp_options["tls"] = True
-    elif settings.SMTP_SSL:
-        smtp_options["ssl"] = True
-    if settings.SMTP_USER:
-        smtp_options["user"] = settings.SMTP_USER
-    if settings.SMTP_PASSWORD:
-        smtp_options["password"] = settings.SMTP_PASSWORD
-    response = message.send(to=email_to, smtp=smtp_options)
-    logger.info(f"send email result: {response}")
+    assert settings.EMAILS_FROM_EMAIL
+    with _message_lock:
+        message = _get_base_message()
+        message.subject = subject
+        message.html = html_content
+        message.mail_to = email_to
+        try:
+            refused = _send_message(
+                settings.EMAILS_FROM_EMAIL, email_to, message.as_string()
+            )
+        except (smtplib.SMTPException, OSError) as e:
+            # Sends run as background tasks; like the emails library did,
+            # report the failure instead of raising
+            logger.error("send email failed: %r", e)
+            return
+    logger.info("send email result: refused=%s", refused)
 
 
 def generate_test_email(email_to: str) -> EmailData:
-    project_name = settings.PROJECT_NAME
-    subject = f"{project_name} - Test email"
+    subject = _TEST_EMAIL_SUBJECT
     html_content = render_email_template(
         template_name="test_email.html",
-        context={"project_name": settings.PROJECT_NAME, "email": email_to},
+        context={"project_name": _PROJECT_NAME, "email": email_to},
     )
     return EmailData(html_content=html_content, subject=subject)
 
 
 def generate_reset_password_email(email_to: str, email: str, token: str) -> EmailData:
-    project_name = settings.PROJECT_NAME
-    subject = f"{project_name} - Password recovery for user {email}"
-    link = f"{settings.FRONTEND_HOST}/reset-password?token={token}"
+    subject = _RESET_PASSWORD_SUBJECT_PREFIX + email
+    link = _RESET_LINK_PREFIX + token
     html_content = render_email_template(
         template_name="reset_password.html",
         context={
-            "project_name": settings.PROJECT_NAME,
+            "project_name": _PROJECT_NAME,
             "username": email,
             "email": email_to,
-            "valid_hours": settings.EMAIL_RESET_TOKEN_EXPIRE_HOURS,
+            "valid_hours": _EMAIL_RESET_HOURS,
             "link": link,
         },
     )
@@ -85,109 +239,180 @@ def generate_reset_password_email(email_to: str, email: str, token: str) -> Emai
 def generate_new_account_email(
     email_to: str, username: str, password: str
 ) -> EmailData:
-    project_name = settings.PROJECT_NAME
-    subject = f"{project_name} - New account for user {username}"
+    subject = _NEW_ACCOUNT_SUBJECT_PREFIX + username
     html_content = render_email_template(
         template_name="new_account.html",
         context={
-            "project_name": settings.PROJECT_NAME,
+            "project_name": _PROJECT_NAME,
             "username": username,
             "password": password,
             "email": email_to,
-            "link": settings.FRONTEND_HOST,
+            "link": _FRONTEND_HOST,
         },
     )
     return EmailData(html_content=html_content, subject=subject)
 
 
 def generate_password_reset_token(email: str) -> str:
-    delta = timedelta(hours=settings.EMAIL_RESET_TOKEN_EXPIRE_HOURS)
-    now = datetime.now(timezone.utc)
-    expires = now + delta
-    exp = expires.timestamp()
-    encoded_jwt = jwt.encode(
-        {"exp": exp, "nbf": now, "sub": email},
-        settings.SECRET_KEY,
-        algorithm=security.ALGORITHM,
-    )
-    return encoded_jwt
+    # JWT exp/nbf are plain epoch seconds
+    now = int(time.time())
+    payload = {"exp": now + _EMAIL_RESET_SECONDS, "nbf": now, "sub": email}
+    if _JWT_ALG != "HS256":
+        return jwt.encode(payload, _JWT_KEY, algorithm=_JWT_ALG)
+    # Sign directly over the prebuilt header instead of going through PyJWT's
+    # generic header/payload serialization
+    payload_b64 = _b64url(json.dumps(payload, separators=(",", ":")).encode())
+    signing_input = _HS256_HEADER_B64 + b"." + payload_b64
+    signature = hmac.digest(_JWT_KEY, signing_input, "sha256")
+    return (signing_input + b"." + _b64url(signature)).decode()
+
+
+# Subjects of recently verified reset tokens, keyed by token digest. Reset
+# links get opened repeatedly (reloads, prefetchers, link scanners); entries
+# never outlive the token's exp and failures are never cached.
+_reset_token_cache = TTLCache(maxsize=1024, ttl=60)
 
 
 def verify_password_reset_token(token: str) -> str | None:
+    # A compact JWS always has exactly three dot-separated parts
+    if token.count(".") != 2:
+        return None
+    key = security.token_cache_key(token)
+    cached_email: str | None = _reset_token_cache.get(key)
+    if cached_email is not None:
+        return cached_email
     try:
         decoded_token = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
+            token,
+            _JWT_KEY,
+            algorithms=_JWT_ALGS,
+            options={"require": ["exp", "nbf", "sub"]},
         )
-        return str(decoded_token["sub"])
     except InvalidTokenError:
         return None
+    email = str(decoded_token["sub"])
+    _reset_token_cache.set(key, email, ttl=decoded_token["exp"] - time.time())
+    return email
+
+
+def invalidate_password_reset_token(token: str) -> None:
+    _reset_token_cache.pop(security.token_cache_key(token))
 
 
-def validate_pdf_integrity(file_content: bytes) -> Optional[str]:
+@functools.cache
+def _get_pdf_page_counter() -> Optional[Callable[[str], int]]:
+    """
+    Resolve the PDF parser used for deep validation on first use.
+    
+    Prefers PyPDF2, falling back to the pypdfium2 or PyMuPDF C-engine
+    bindings. The result is cached so later calls don't re-enter the import
+    machinery, including when no parser is installed.
+    
+    Returns:
+        A function returning the page count of a PDF file, or None
+    """
+    try:
+        import PyPDF2
+
+        return lambda file_path: len(PyPDF2.PdfReader(file_path).pages)
+    except ImportError:
+        pass
+
+    try:
+        import pypdfium2 as pdfium  # type: ignore
+
+        def count_pages_pdfium(file_path: str) -> int:
+            doc = pdfium.PdfDocument(file_path)
+            try:
+                return len(doc)
+            finally:
+                doc.close()
+
+        return count_pages_pdfium
+    except ImportError:
+        pass
+
+    try:
+        import fitz  # type: ignore
+
+        def count_pages_fitz(file_path: str) -> int:
+            with fitz.open(file_path, filetype="pdf") as doc:
+                return int(doc.page_count)
+
+        return count_pages_fitz
+    except ImportError:
+        return None
+
+
+# How much of the end of a PDF is searched for the startxref/%%EOF trailer
+_PDF_TAIL_SIZE = 1024
+# The startxref offset immediately preceding a %%EOF marker; searched with
+# endpos at the last %%EOF, so incremental updates resolve to the final xref
+_STARTXREF_RE = re.compile(rb"startxref\s*(\d+)\s*\Z")
+
+
+def validate_pdf_integrity(file_path: str, deep: bool = False) -> Optional[str]:
     """
     Validate PDF file integrity - check if file can be opened and read
     
+    The default check is structural and only reads the first and last
+    kilobyte: the %PDF- header, the %%EOF trailer and a startxref offset that
+    points inside the file. With deep=True the file is also parsed to make
+    sure it has pages.
+    
     Args:
-        file_content: The PDF file content as bytes
+        file_path: Path to the PDF file on disk
+        deep: Also parse the document, not just its header and trailer
         
     Returns:
         None if PDF is valid, error message string if invalid
     """
     try:
-        import PyPDF2
-        import io
-        
-        # Create a BytesIO object from the file content
-        pdf_stream = io.BytesIO(file_content)
-        
-        # Try to read the PDF using PyPDF2
-        pdf_reader = PyPDF2.PdfReader(pdf_stream)
-        
-        # Check if PDF has pages
-        if len(pdf_reader.pages) == 0:
-            return "PDF file appears to be empty or corrupted (no pages found)."
-        
-        # Try to read text from first page to ensure file is not corrupted
-        try:
-            first_page = pdf_reader.pages[0]
-            # Attempt to extract text (this will fail if PDF is corrupted)
-            _ = first_page.extract_text()
-        except Exception as page_error:
-            return f"PDF file appears to be corrupted or cannot be read: {str(page_error)}"
-            
-        # Reset stream for further use
-        pdf_stream.seek(0)
-        
+        # Only the header and the tail are read, straight into one buffer;
+        # the document body is never loaded
+        with open(file_path, "rb") as f:
+            file_size = f.seek(0, os.SEEK_END)
+            tail_size = min(file_size, _PDF_TAIL_SIZE)
+            buffer = bytearray(5 + tail_size)
+            view = memoryview(buffer)
+            f.seek(0)
+            f.readinto(view[:5])
+            f.seek(file_size - tail_size)
+            f.readinto(view[5:])
+    except OSError as e:
+        return f"PDF file appears to be corrupted or cannot be read: {str(e)}"
+
+    if buffer[:5] != b"%PDF-":
+        return "File is not a valid PDF (missing %PDF- header)."
+    # Search the tail in place rather than slicing it out of the buffer
+    eof = buffer.rfind(b"%%EOF", 5)
+    if eof < 0:
+        return "PDF file appears to be truncated or corrupted (missing %%EOF marker)."
+    # Finds the trailer before the last %%EOF and captures the offset in one go
+    match = _STARTXREF_RE.search(buffer, 5, eof)
+    if match is None:
+        if buffer.rfind(b"startxref", 5, eof) < 0:
+            return "PDF file appears to be corrupted (missing startxref)."
+        return "PDF file appears to be corrupted (invalid startxref offset)."
+    offset = int(match.group(1))
+    if not 0 < offset < file_size:
+        return "PDF file appears to be corrupted (invalid startxref offset)."
+
+    if not deep:
         return None  # PDF is valid
-        
-    except ImportError:
-        # Fallback to PyPDFLoader if PyPDF2 is not available
-        try:
-            import tempfile
-            import os
-            from langchain_community.document_loaders import PyPDFLoader
-            
-            # Create a temporary file to test PDF loading
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                temp_file.write(file_content)
-                temp_file_path = temp_file.name
-            
-            try:
-                # Try to load the PDF using PyPDFLoader
-                loader = PyPDFLoader(temp_file_path)
-                docs = loader.load()
-                
-                if not docs or len(docs) == 0:
-                    return "PDF file appears to be empty or corrupted (no content found)."
-                    
-                return None  # PDF is valid
-                    
-            finally:
-                # Clean up temporary file
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
-                    
-        except Exception as loader_error:
-            return f"PDF file appears to be corrupted or cannot be read: {str(loader_error)}"
+
+    count_pages = _get_pdf_page_counter()
+    if count_pages is None:
+        logger.warning("No PDF parser available, skipping deep PDF validation")
+        return None
+
+    try:
+        page_count = count_pages(file_path)
     except Exception as pdf_error:
         return f"PDF file appears to be corrupted or cannot be read: {str(pdf_error)}"
+
+    # Check if PDF has pages
+    if page_count == 0:
+        return "PDF file appears to be empty or corrupted (no pages found)."
+
+    return None  # PDF is valid